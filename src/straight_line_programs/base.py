@@ -2,21 +2,48 @@
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, Optional, Set, Tuple
+import hashlib
+import os
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from .errors import ExpansionTooLargeError, GrammarValidationError
 
 
+def _join_source(pieces: List[str]) -> str:
+    """Return Python source concatenating the given expression pieces."""
+    if len(pieces) == 1:
+        return pieces[0]
+    return f"\"\".join(({', '.join(pieces)},))"
+
+
 class BaseGrammar:
     """Base class for straight-line program variants.
 
     Concrete subclasses define:
     - Which rule types are allowed.
     - How rule size and rule length are computed.
-    - How rules expand into explicit strings.
+    - How rules are indexed and sliced (full expansion is a slice).
+
+    Random access and slicing hooks receive get_char / get_substring callbacks
+    that may defer the child lookup, so a rule either returns a literal or
+    returns only the (concatenated) results of those callbacks. The optional
+    fourth argument of get_substring repeats the requested slice.
+
+    Hooks only ever see rules that passed validation, so they test every rule
+    kind but the last one and fall through to it.
     """
 
     rule_types: Tuple[type, ...] = ()
+    # Largest number of reachable nonterminals expanded by generated code.
+    compile_threshold: int = 256
+    # Bounds of the per-instance cache of recent expansions: number of
+    # entries, and longest expansion worth keeping (in characters). Set
+    # expansion_cache_size to 0 to disable the cache.
+    expansion_cache_size: int = 8
+    expansion_cache_limit: int = 1 << 16
 
     def __init__(self, rules: Dict[str, object], start: str) -> None:
         """Create a grammar with a rule map and a start symbol.
@@ -25,69 +52,137 @@ class BaseGrammar:
             rules: Mapping from nonterminal names to rule objects.
             start: Start symbol for the grammar.
         """
-        self.rules = dict(rules)
+        self.rules = {self._intern_name(symbol): rule for symbol, rule in rules.items()}
         self.start = start
         self._lengths: Dict[str, int] = {}
+        self._topo_order: Tuple[str, ...] = ()
+        self._size = 0
+        self._fingerprint: Optional[str] = None
+        self._expanders: Dict[str, Optional[Callable[[], str]]] = {}
+        self._expansion_cache: Dict[str, str] = {}
+        # Rules walked by expansion and access; subclasses may substitute
+        # equivalent, cheaper rules here without changing self.rules.
+        self._access_rules: Dict[str, object] = self.rules
         self.validate()
 
     def validate(self) -> None:
-        """Validate the grammar structure and precompute lengths.
+        """Validate the grammar structure and precompute lengths and size.
 
         Checks:
         - Start symbol is defined.
-        - Rule types are valid for the subclass.
+        - Rule types and rule parameters are valid for the subclass.
         - All referenced nonterminals exist.
         - Grammar is acyclic.
         """
-        if self.start not in self.rules:
+        rules = self.rules
+        if self.start not in rules:
             raise GrammarValidationError("Start symbol must be defined in rules.")
-        for symbol, rule in self.rules.items():
+        for symbol, rule in rules.items():
             if not isinstance(rule, self.rule_types):
                 raise GrammarValidationError(
                     f"Invalid rule type for {symbol}: {type(rule).__name__}"
                 )
-            for ref in self._referenced_nonterminals(rule):
-                if ref not in self.rules:
+            self._validate_rule(rule)
+            rules[symbol] = self._intern_rule(rule)
+        self._size = sum(self._rule_size(rule) for rule in rules.values())
+
+        # Kahn's algorithm over the reversed reference edges: a symbol is
+        # ready once every nonterminal it references has been emitted, so the
+        # order lists children before parents. Symbols left over lie on (or
+        # depend on) a cycle.
+        pending: Dict[str, int] = {}
+        dependents: Dict[str, List[str]] = {symbol: [] for symbol in rules}
+        for symbol, rule in rules.items():
+            refs = list(self._referenced_nonterminals(rule))
+            for ref in refs:
+                if ref not in rules:
                     raise GrammarValidationError(
                         f"Undefined nonterminal '{ref}' referenced by {symbol}."
                     )
-        for symbol in self.rules:
-            self._compute_length(symbol, set())
-
-    def _compute_length(self, symbol: str, visiting: Set[str]) -> int:
-        """Compute |exp(symbol)| with cycle detection and memoization."""
-        if symbol in self._lengths:
-            return self._lengths[symbol]
-        if symbol in visiting:
+                dependents[ref].append(symbol)
+            pending[symbol] = len(refs)
+        ready = deque(symbol for symbol, count in pending.items() if count == 0)
+        order: List[str] = []
+        while ready:
+            symbol = ready.popleft()
+            order.append(symbol)
+            for parent in dependents[symbol]:
+                pending[parent] -= 1
+                if pending[parent] == 0:
+                    ready.append(parent)
+        if len(order) < len(rules):
             raise GrammarValidationError("Grammar contains a cycle.")
-        visiting.add(symbol)
-        rule = self.rules[symbol]
-        length = self._rule_length(rule, lambda s: self._compute_length(s, visiting))
-        self._lengths[symbol] = length
-        visiting.remove(symbol)
-        return length
+        self._topo_order = tuple(order)
+        self._access_rules = rules
+        self._expanders = {}
+        self._expansion_cache = {}
+        self._fingerprint = None
+
+        # Children precede parents in the order, so one bottom-up pass
+        # sees every child length already computed.
+        lengths = self._lengths
+        get_len = lengths.__getitem__
+        for symbol in order:
+            lengths[symbol] = self._rule_length(rules[symbol], get_len)
 
     def length(self, symbol: Optional[str] = None) -> int:
-        """Return the length of the expansion of a symbol (defaults to start)."""
+        """Return the length of the expansion of a symbol (defaults to start).
 
-        sym = symbol or self.start
-        return self._compute_length(sym, set())
+        Lengths are filled for every nonterminal by validate(), so this is a
+        dictionary lookup.
+        """
+
+        return self._lengths[symbol or self.start]
 
-    def expression(self, symbol: Optional[str] = None, max_length: Optional[int] = 100000) -> str:
+    def expression(
+        self,
+        symbol: Optional[str] = None,
+        max_length: Optional[int] = 100000,
+        cache_dir: Optional[Union[str, os.PathLike]] = None,
+    ) -> str:
         """Expand a symbol to its explicit string.
 
+        Recent expansions of at most expansion_cache_limit characters are kept
+        on the instance, at most expansion_cache_size of them (by default 8
+        strings of up to 64 Ki characters, 512 Ki characters in total), and
+        repeated calls return the cached string.
+
         Args:
             symbol: Nonterminal to expand. Defaults to the start symbol.
             max_length: Optional guard to prevent huge expansions.
+            cache_dir: Optional directory for persisting expansions across runs,
+                keyed by a fingerprint of the grammar rules and the symbol.
         """
 
         sym = symbol or self.start
-        length = self.length(sym)
+        length = self._lengths[sym]
         if max_length is not None and length > max_length:
             raise ExpansionTooLargeError(
                 f"Expansion length {length} exceeds max_length={max_length}."
             )
-        return self._expand_symbol(sym)
+        if cache_dir is None:
+            return self._expand_symbol(sym)
+        path = Path(cache_dir) / f"{self._cache_key(sym)}.txt"
+        try:
+            return path.read_bytes().decode("utf-8")
+        except FileNotFoundError:
+            pass
+        text = self._expand_symbol(sym)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(text.encode("utf-8"))
+        os.replace(tmp_path, path)
+        return text
+
+    def _cache_key(self, symbol: str) -> str:
+        """Return a stable file-name key for the expansion of symbol."""
+        if self._fingerprint is None:
+            canonical = repr((type(self).__name__, sorted(self.rules.items())))
+            self._fingerprint = hashlib.blake2b(
+                canonical.encode("utf-8"), digest_size=16
+            ).hexdigest()
+        digest = hashlib.blake2b(symbol.encode("utf-8"), digest_size=8).hexdigest()
+        return f"{self._fingerprint}-{digest}"
 
     def char_at(self, index: int, symbol: Optional[str] = None) -> str:
         """Return the character at position index (0-based).
@@ -98,7 +193,7 @@ class BaseGrammar:
         """
 
         sym = symbol or self.start
-        length = self.length(sym)
+        length = self._lengths[sym]
         if index < 0 or index >= length:
             raise IndexError(f"Index {index} out of range for length {length}.")
         return self._char_at_symbol(sym, index)
@@ -122,7 +217,7 @@ class BaseGrammar:
         """
 
         sym = symbol or self.start
-        length = self.length(sym)
+        length = self._lengths[sym]
         if include_end:
             if start < 0 or end < start or end >= length:
                 raise IndexError(
@@ -140,64 +235,206 @@ class BaseGrammar:
         return self._substring_symbol(sym, start, end_exclusive)
 
     def _expand_symbol(self, symbol: str) -> str:
-        """Recursively expand a symbol using the subclass rule semantics."""
-        rule = self.rules[symbol]
-        return self._rule_expand(rule, self._expand_symbol)
+        """Expand a symbol using the subclass rule semantics.
+
+        Small grammars run a generated straight-line expander (see
+        _compile_expander). Otherwise a full expansion is the slice
+        [0, |exp(symbol)|) and shares the substring walker.
+
+        Expansions of at most expansion_cache_limit characters are kept in a
+        small least-recently-used cache, so repeated calls return the same
+        string object without expanding again.
+        """
+        cache = self._expansion_cache
+        text = cache.pop(symbol, None)
+        if text is None:
+            if symbol not in self._expanders:
+                self._expanders[symbol] = self._compile_expander(symbol)
+            expander = self._expanders[symbol]
+            if expander is not None:
+                text = expander()
+            else:
+                text = self._substring_symbol(symbol, 0, self._lengths[symbol])
+            if not self.expansion_cache_size or len(text) > self.expansion_cache_limit:
+                return text
+            if len(cache) >= self.expansion_cache_size:
+                del cache[next(iter(cache))]
+        cache[symbol] = text
+        return text
+
+    def _compile_expander(self, symbol: str) -> Optional[Callable[[], str]]:
+        """Generate a function expanding symbol in one straight-line pass.
+
+        The rules reachable from symbol are emitted in topological order from
+        the pieces given by _rule_source, so expansion runs without any rule
+        dispatch. Only nonterminals referenced more than once get their own
+        string, built once and reused; the others are spliced into their
+        parent's single join. Returns None when more than compile_threshold
+        nonterminals are reachable, to keep the generated source small.
+        """
+        rules = self._access_rules
+        reachable = {symbol}
+        stack = [symbol]
+        while stack:
+            for ref in self._referenced_nonterminals(rules[stack.pop()]):
+                if ref not in reachable:
+                    if len(reachable) >= self.compile_threshold:
+                        return None
+                    reachable.add(ref)
+                    stack.append(ref)
+        uses = dict.fromkeys(reachable, 0)
+        for sym in reachable:
+            for ref in self._referenced_nonterminals(rules[sym]):
+                uses[ref] += 1
+
+        names: Dict[str, str] = {}
+        # local name -> pieces of a nonterminal used once, not yet spliced
+        inlined: Dict[str, List[str]] = {}
+        lines = ["def expand():"]
+        for sym in self._topo_order:
+            if sym not in reachable:
+                continue
+            rule = rules[sym]
+            name = names[sym] = f"v{len(names)}"
+            pieces: List[str] = []
+            for piece in self._rule_source(rule, names):
+                pieces.extend(inlined.pop(piece, (piece,)))
+            for ref in self._referenced_nonterminals(rule):
+                # Used inside a larger expression, so it needs its own value.
+                if names[ref] in inlined:
+                    ref_pieces = inlined.pop(names[ref])
+                    lines.append(f"    {names[ref]} = {_join_source(ref_pieces)}")
+            if sym == symbol:
+                lines.append(f"    return {_join_source(pieces)}")
+            elif uses[sym] == 1:
+                inlined[name] = pieces
+            else:
+                lines.append(f"    {name} = {_join_source(pieces)}")
+        namespace: Dict[str, object] = {}
+        code = compile("\n".join(lines), f"<{type(self).__name__} expander>", "exec")
+        exec(code, namespace)
+        return namespace["expand"]
 
     def _char_at_symbol(self, symbol: str, index: int) -> str:
-        """Return the character at index within a symbol expansion."""
-        rule = self.rules[symbol]
-        return self._rule_char_at(rule, index, self._char_at_symbol, self._lengths.__getitem__)
+        """Return the character at index within a symbol expansion.
+
+        Rules delegate to a child through get_char; the delegation is recorded
+        and followed in a loop instead of a nested call.
+        """
+        rules = self._access_rules
+        get_len = self._lengths.__getitem__
+        rule_char_at = self._rule_char_at
+        target: List[Tuple[str, int]] = []
+        defer = target.append
+
+        def get_char(sym: str, idx: int) -> str:
+            defer((sym, idx))
+            return ""
+
+        while True:
+            char = rule_char_at(rules[symbol], index, get_char, get_len)
+            if not target:
+                return char
+            symbol, index = target.pop()
 
     def _substring_symbol(self, symbol: str, start: int, end: int) -> str:
-        """Return the substring within a symbol expansion (end-exclusive)."""
-        rule = self.rules[symbol]
-        return self._rule_substring(
-            rule, start, end, self._substring_symbol, self._lengths.__getitem__
-        )
+        """Return the substring within a symbol expansion (end-exclusive).
+
+        Rules delegate child slices through get_substring, which pushes them
+        as (symbol, start, end, repeat) entries straight onto an explicit
+        stack. Children are therefore popped right to left: literal pieces are
+        collected in reverse and joined once at the end.
+
+        Whole nonterminals are memoized for the duration of the call: the
+        first full occurrence records which pieces it produced, and any later
+        slice of that symbol (full or partial, e.g. the tail of a run after
+        its middle repetitions) reuses that text instead of walking the rule
+        again.
+        """
+        rules = self._access_rules
+        lengths = self._lengths
+        get_len = lengths.__getitem__
+        rule_substring = self._rule_substring
+        stack = [(symbol, start, end, 1)]
+        push = stack.append
+        pop = stack.pop
+
+        def get_substring(sym: str, sub_start: int, sub_end: int, repeat: int = 1) -> str:
+            push((sym, sub_start, sub_end, repeat))
+            return ""
+
+        parts: List[str] = []  # in reverse order
+        emit = parts.append
+        # symbol -> (first, stop) range into parts, or its joined expansion
+        expanded: Dict[str, Union[Tuple[int, int], str]] = {}
+        while stack:
+            sym, sub_start, sub_end, repeat = pop()
+            if sub_start < 0:
+                # End marker: sub_end holds where the expansion of sym began.
+                expanded[sym] = (sub_end, len(parts))
+                continue
+            full = sub_start == 0 and sub_end == lengths[sym]
+            if sym in expanded:
+                text = expanded[sym]
+                if not isinstance(text, str):
+                    text = expanded[sym] = "".join(reversed(parts[text[0] : text[1]]))
+                if not full:
+                    text = text[sub_start:sub_end]
+                emit(text * repeat if repeat > 1 else text)
+                continue
+            if repeat > 1:
+                # Produce one copy first; the remaining copies reuse it.
+                push((sym, sub_start, sub_end, repeat - 1))
+                push((sym, sub_start, sub_end, 1))
+                continue
+            if full:
+                push((sym, -1, len(parts), 1))
+            text = rule_substring(rules[sym], sub_start, sub_end, get_substring, get_len)
+            if text:
+                emit(text)
+        parts.reverse()
+        return "".join(parts)
 
     @staticmethod
-    def _char_in_repetition(symbol: str, repeat_count: int, index: int, get_char, get_len) -> str:
-        """Index into a repeated symbol block."""
-        base_len = get_len(symbol)
-        total_len = base_len * repeat_count
-        if index < 0 or index >= total_len:
-            raise IndexError(
-                f"Index {index} out of range for repeated length {total_len}."
-            )
-        local_index = index % base_len
-        return get_char(symbol, local_index)
+    def _char_in_repetition(symbol: str, index: int, get_char, get_len) -> str:
+        """Index into a repeated symbol block.
+
+        Internal helper: callers guarantee index lies within the block, i.e.
+        0 <= index < (repeat count) * |exp(symbol)|, which the public char_at()
+        checks once at the top level.
+        """
+        return get_char(symbol, index % get_len(symbol))
 
     @staticmethod
     def _substring_in_repetition(
-        symbol: str, repeat_count: int, start: int, end: int, get_substring, get_len
+        symbol: str, start: int, end: int, get_substring, get_len
     ) -> str:
-        """Slice within a repeated symbol block (end-exclusive)."""
+        """Slice within a repeated symbol block (end-exclusive).
+
+        Internal helper: callers guarantee the range lies within the block, i.e.
+        0 <= start <= end <= (repeat count) * |exp(symbol)|, which the public
+        substring() checks once at the top level.
+        """
         base_len = get_len(symbol)
-        total_len = base_len * repeat_count
-        if start < 0 or end < start or end > total_len:
-            raise IndexError(
-                f"Substring bounds must satisfy 0 <= start <= end <= {total_len}."
-            )
         if start == end:
             return ""
         first_rep = start // base_len
         last_rep = (end - 1) // base_len
-        parts = []
-        for rep in range(first_rep, last_rep + 1):
-            local_start = 0
-            local_end = base_len
-            if rep == first_rep:
-                local_start = start - rep * base_len
-            if rep == last_rep:
-                local_end = end - rep * base_len
-            parts.append(get_substring(symbol, local_start, local_end))
+        head_start = start - first_rep * base_len
+        tail_end = end - last_rep * base_len
+        if first_rep == last_rep:
+            return get_substring(symbol, head_start, tail_end)
+        parts = [get_substring(symbol, head_start, base_len)]
+        middle_count = last_rep - first_rep - 1
+        if middle_count:
+            parts.append(get_substring(symbol, 0, base_len, middle_count))
+        parts.append(get_substring(symbol, 0, tail_end))
         return "".join(parts)
 
     def size(self) -> int:
         """Return the grammar size as defined in the paper for this variant."""
 
-        return sum(self._rule_size(rule) for rule in self.rules.values())
+        return self._size
 
     def nonterminals(self) -> Tuple[str, ...]:
         """Return all nonterminal names in this grammar."""
@@ -207,6 +444,27 @@ class BaseGrammar:
         """Return nonterminals referenced by the given rule."""
         raise NotImplementedError
 
+    def _validate_rule(self, rule: object) -> None:
+        """Raise GrammarValidationError if a rule's own parameters are invalid."""
+
+    @staticmethod
+    def _intern_name(name: str) -> str:
+        """Return name interned if it is an exact str, and unchanged otherwise.
+
+        sys.intern rejects str subclasses (e.g. enum members) and other
+        hashable names; those are still valid keys and keep working, and
+        references of the wrong type are reported by validate().
+        """
+        return sys.intern(name) if type(name) is str else name
+
+    def _intern_rule(self, rule: object) -> object:
+        """Return rule with its nonterminal references interned (see _intern_name).
+
+        Interned names let the many rules/_lengths lookups compare keys by
+        identity. Rules are frozen, so a new rule is built only if needed.
+        """
+        return rule
+
     def _rule_size(self, rule: object) -> int:
         """Return the contribution of a rule to grammar size."""
         raise NotImplementedError
@@ -215,8 +473,12 @@ class BaseGrammar:
         """Return |exp(A)| for a rule A using get_len for nonterminals."""
         raise NotImplementedError
 
-    def _rule_expand(self, rule: object, expand_symbol) -> str:
-        """Expand a rule to a concrete string."""
+    def _rule_source(self, rule: object, names: Dict[str, str]) -> Tuple[str, ...]:
+        """Return Python expressions whose concatenation is exp(A).
+
+        Nonterminals are referred to by their local names in names; a piece
+        that is exactly such a name may be replaced by that symbol's pieces.
+        """
         raise NotImplementedError
 
     def _rule_char_at(self, rule: object, index: int, get_char, get_len) -> str:
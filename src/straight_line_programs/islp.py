@@ -2,14 +2,64 @@
 
 from __future__ import annotations
 
+from fractions import Fraction
+from functools import lru_cache
+from math import comb
 from typing import Dict, Iterable, Tuple, Union
 
 from .base import BaseGrammar
 from .errors import GrammarValidationError
-from .rules import BinaryRule, IterationRule, TerminalRule
+from .rules import (
+    BINARY,
+    ITERATION,
+    TERMINAL,
+    BinaryRule,
+    IterationComponent,
+    IterationRule,
+    TerminalRule,
+)
 
 ISLPRule = Union[TerminalRule, BinaryRule, IterationRule]
 
+# Faulhaber closed forms for sum_{i=1}^{n} i^c, indexed by the exponent c.
+_POWER_SUMS = {
+    0: lambda n: n,
+    1: lambda n: n * (n + 1) // 2,
+    2: lambda n: n * (n + 1) * (2 * n + 1) // 6,
+    3: lambda n: (n * (n + 1) // 2) ** 2,
+    4: lambda n: n * (n + 1) * (2 * n + 1) * (3 * n * n + 3 * n - 1) // 30,
+}
+
+
+@lru_cache(maxsize=None)
+def _faulhaber_coefficients(exponent: int) -> Tuple[Fraction, ...]:
+    """Return a_0..a_{c+1} with sum_{i=1}^{n} i^c = sum_k a_k n^k for c = exponent.
+
+    Uses Faulhaber's formula with Bernoulli numbers B_j (B_1 = +1/2).
+    """
+    bernoulli = [Fraction(1)]
+    for m in range(1, exponent + 1):
+        acc = sum(comb(m + 1, k) * bernoulli[k] for k in range(m))
+        bernoulli.append(-acc / (m + 1))
+    if exponent >= 1:
+        bernoulli[1] = Fraction(1, 2)
+    coefficients = [Fraction(0)] * (exponent + 2)
+    for j in range(exponent + 1):
+        coefficients[exponent + 1 - j] = comb(exponent + 1, j) * bernoulli[j] / (exponent + 1)
+    return tuple(coefficients)
+
+
+def _power_sum(exponent: int, k1: int, k2: int) -> int:
+    """Return sum_{i=k1}^{k2} i^exponent in closed form."""
+    closed_form = _POWER_SUMS.get(exponent)
+    if closed_form is not None:
+        return closed_form(k2) - closed_form(k1 - 1)
+    coefficients = _faulhaber_coefficients(exponent)
+    total = Fraction(0)
+    for power, coefficient in enumerate(coefficients):
+        total += coefficient * (k2 ** power - (k1 - 1) ** power)
+    return int(total)
+
 
 class ISLP(BaseGrammar):
     """Iterated Straight-Line Program (ISLP).
@@ -28,151 +78,160 @@ class ISLP(BaseGrammar):
 
     def _referenced_nonterminals(self, rule: ISLPRule) -> Iterable[str]:
         """Return referenced nonterminals for an ISLP rule."""
-        if isinstance(rule, BinaryRule):
+        kind = rule.kind
+        if kind == BINARY:
             return (rule.left, rule.right)
-        if isinstance(rule, IterationRule):
+        if kind == ITERATION:
             return tuple(component.symbol for component in rule.components)
         return ()
 
+    def _validate_rule(self, rule: ISLPRule) -> None:
+        """Reject empty terminals and malformed iteration bounds or exponents."""
+        kind = rule.kind
+        if kind == TERMINAL and not rule.terminal:
+            raise GrammarValidationError("Terminal string must be non-empty.")
+        if kind == ITERATION:
+            if rule.k1 < 1 or rule.k2 < 1 or rule.k1 > rule.k2:
+                raise GrammarValidationError("Iteration bounds must satisfy 1 <= k1 <= k2.")
+            for component in rule.components:
+                if component.exponent < 0:
+                    raise GrammarValidationError("Iteration exponents must be >= 0.")
+
+    def _intern_rule(self, rule: ISLPRule) -> ISLPRule:
+        """Return an ISLP rule with interned nonterminal references."""
+        kind = rule.kind
+        if kind == BINARY:
+            left, right = self._intern_name(rule.left), self._intern_name(rule.right)
+            if left is not rule.left or right is not rule.right:
+                return BinaryRule(left, right)
+        if kind == ITERATION:
+            components = tuple(
+                IterationComponent(self._intern_name(component.symbol), component.exponent)
+                for component in rule.components
+            )
+            if any(
+                new.symbol is not old.symbol for new, old in zip(components, rule.components)
+            ):
+                return IterationRule(rule.k1, rule.k2, components)
+        return rule
+
     def _rule_size(self, rule: ISLPRule) -> int:
         """Return the size contribution of an ISLP rule."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return 1
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
             return 2
-        if isinstance(rule, IterationRule):
-            t = len(rule.components)
-            return 2 * t + 2
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == ITERATION
+        t = len(rule.components)
+        return 2 * t + 2
 
     def _rule_length(self, rule: ISLPRule, get_len) -> int:
         """Compute |exp(A)| for an ISLP rule."""
-        if isinstance(rule, TerminalRule):
-            if not rule.terminal:
-                raise GrammarValidationError("Terminal string must be non-empty.")
+        kind = rule.kind
+        if kind == TERMINAL:
             return len(rule.terminal)
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
             return get_len(rule.left) + get_len(rule.right)
-        if isinstance(rule, IterationRule):
-            if rule.k1 < 1 or rule.k2 < 1 or rule.k1 > rule.k2:
-                raise GrammarValidationError("Iteration bounds must satisfy 1 <= k1 <= k2.")
-            for component in rule.components:
-                if component.exponent < 0:
-                    raise GrammarValidationError("Iteration exponents must be >= 0.")
-            total = 0
-            lengths = [get_len(component.symbol) for component in rule.components]
-            exponents = [component.exponent for component in rule.components]
-            for i in range(rule.k1, rule.k2 + 1):
-                for length, exponent in zip(lengths, exponents):
-                    total += length * (i ** exponent)
-            return total
-        raise GrammarValidationError("Unsupported rule type.")
-
-    def _rule_expand(self, rule: ISLPRule, expand_symbol) -> str:
-        """Expand an ISLP rule to its explicit string."""
-        if isinstance(rule, TerminalRule):
-            return rule.terminal
-        if isinstance(rule, BinaryRule):
-            return expand_symbol(rule.left) + expand_symbol(rule.right)
-        if isinstance(rule, IterationRule):
-            if rule.k1 < 1 or rule.k2 < 1 or rule.k1 > rule.k2:
-                raise GrammarValidationError("Iteration bounds must satisfy 1 <= k1 <= k2.")
-            for component in rule.components:
-                if component.exponent < 0:
-                    raise GrammarValidationError("Iteration exponents must be >= 0.")
-            parts = []
-            expanded = [expand_symbol(component.symbol) for component in rule.components]
-            exponents = [component.exponent for component in rule.components]
-            for i in range(rule.k1, rule.k2 + 1):
-                for segment, exponent in zip(expanded, exponents):
-                    parts.append(segment * (i ** exponent))
-            return "".join(parts)
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == ITERATION
+        return sum(
+            get_len(component.symbol) * _power_sum(component.exponent, rule.k1, rule.k2)
+            for component in rule.components
+        )
+
+    def _rule_source(self, rule: ISLPRule, names: Dict[str, str]) -> Tuple[str, ...]:
+        """Return Python expressions concatenating to exp(A) for an ISLP rule."""
+        kind = rule.kind
+        if kind == TERMINAL:
+            return (repr(rule.terminal),)
+        if kind == BINARY:
+            return (names[rule.left], names[rule.right])
+        # kind == ITERATION
+        blocks = ", ".join(
+            f"{names[component.symbol]} * i ** {component.exponent}"
+            for component in rule.components
+        )
+        return (f'"".join(s for i in range({rule.k1}, {rule.k2 + 1}) for s in ({blocks},))',)
 
     def _rule_char_at(self, rule: ISLPRule, index: int, get_char, get_len) -> str:
         """Return the character at index for an ISLP rule."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return rule.terminal[index]
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
             left_len = get_len(rule.left)
             if index < left_len:
                 return get_char(rule.left, index)
             return get_char(rule.right, index - left_len)
-        if isinstance(rule, IterationRule):
-            if rule.k1 < 1 or rule.k2 < 1 or rule.k1 > rule.k2:
-                raise GrammarValidationError("Iteration bounds must satisfy 1 <= k1 <= k2.")
-            for component in rule.components:
-                if component.exponent < 0:
-                    raise GrammarValidationError("Iteration exponents must be >= 0.")
-            remaining = index
-            for i in range(rule.k1, rule.k2 + 1):
-                for component in rule.components:
-                    base_len = get_len(component.symbol)
-                    repeat_count = i ** component.exponent
-                    block_len = base_len * repeat_count
-                    if remaining < block_len:
-                        return self._char_in_repetition(
-                            component.symbol, repeat_count, remaining, get_char, get_len
-                        )
-                    remaining -= block_len
-            raise IndexError(f"Index {index} out of range for iteration rule.")
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == ITERATION
+        blocks = self._iteration_blocks(rule, get_len)
+        remaining = index
+        for i in range(rule.k1, rule.k2 + 1):
+            for symbol, base_len, exponent in blocks:
+                repeat_count = i ** exponent
+                block_len = base_len * repeat_count
+                if remaining < block_len:
+                    return self._char_in_repetition(symbol, remaining, get_char, get_len)
+                remaining -= block_len
+        raise IndexError(f"Index {index} out of range for iteration rule.")
 
     def _rule_substring(
         self, rule: ISLPRule, start: int, end: int, get_substring, get_len
     ) -> str:
         """Return the substring for an ISLP rule (end-exclusive)."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return rule.terminal[start:end]
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
+            # Clip [start, end) to each child; a straddling range hits both.
             left_len = get_len(rule.left)
-            if end <= left_len:
-                return get_substring(rule.left, start, end)
-            if start >= left_len:
-                return get_substring(rule.right, start - left_len, end - left_len)
-            left_part = get_substring(rule.left, start, left_len)
-            right_part = get_substring(rule.right, 0, end - left_len)
-            return left_part + right_part
-        if isinstance(rule, IterationRule):
-            if rule.k1 < 1 or rule.k2 < 1 or rule.k1 > rule.k2:
-                raise GrammarValidationError("Iteration bounds must satisfy 1 <= k1 <= k2.")
-            for component in rule.components:
-                if component.exponent < 0:
-                    raise GrammarValidationError("Iteration exponents must be >= 0.")
-            parts = []
-            pos = 0
-            for i in range(rule.k1, rule.k2 + 1):
-                for component in rule.components:
-                    base_len = get_len(component.symbol)
-                    repeat_count = i ** component.exponent
-                    block_len = base_len * repeat_count
-                    block_start = pos
-                    block_end = pos + block_len
-                    if block_end <= start:
-                        pos = block_end
-                        continue
-                    if block_start >= end:
-                        return "".join(parts)
-                    local_start = max(start, block_start) - block_start
-                    local_end = min(end, block_end) - block_start
-                    parts.append(
-                        self._substring_in_repetition(
-                            component.symbol,
-                            repeat_count,
-                            local_start,
-                            local_end,
-                            get_substring,
-                            get_len,
-                        )
-                    )
+            text = ""
+            if start < left_len:
+                text = get_substring(rule.left, start, min(end, left_len))
+            if end > left_len:
+                text += get_substring(rule.right, max(start - left_len, 0), end - left_len)
+            return text
+        # kind == ITERATION
+        blocks = self._iteration_blocks(rule, get_len)
+        parts = []
+        pos = 0
+        for i in range(rule.k1, rule.k2 + 1):
+            for symbol, base_len, exponent in blocks:
+                repeat_count = i ** exponent
+                block_len = base_len * repeat_count
+                block_start = pos
+                block_end = pos + block_len
+                if block_end <= start:
                     pos = block_end
-            return "".join(parts)
-        raise GrammarValidationError("Unsupported rule type.")
+                    continue
+                if block_start >= end:
+                    return "".join(parts)
+                local_start = max(start, block_start) - block_start
+                local_end = min(end, block_end) - block_start
+                parts.append(
+                    self._substring_in_repetition(
+                        symbol,
+                        local_start,
+                        local_end,
+                        get_substring,
+                        get_len,
+                    )
+                )
+                pos = block_end
+        return "".join(parts)
+
+    @staticmethod
+    def _iteration_blocks(rule: IterationRule, get_len) -> Tuple[Tuple[str, int, int], ...]:
+        """Return (symbol, |exp(symbol)|, exponent) for each iteration component."""
+        return tuple(
+            (component.symbol, get_len(component.symbol), component.exponent)
+            for component in rule.components
+        )
 
     def length(self, symbol: str | None = None) -> int:
         """Return the length of the expansion of a symbol (defaults to start).
 
-        Length is computed recursively from the rules:
+        Lengths are precomputed bottom-up, in topological order, during validation:
         - Terminal rule A -> a: |exp(A)| = |a|
         - Binary rule A -> B C: |exp(A)| = |exp(B)| + |exp(C)|
         - Iteration rule A -> prod_{i=k1}^{k2} B_1^{i^{c_1}} ... B_t^{i^{c_t}}:
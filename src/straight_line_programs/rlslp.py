@@ -6,7 +6,7 @@ from typing import Dict, Iterable, Tuple, Union
 
 from .base import BaseGrammar
 from .errors import GrammarValidationError
-from .rules import BinaryRule, RunLengthRule, TerminalRule
+from .rules import BINARY, RUN_LENGTH, TERMINAL, BinaryRule, RunLengthRule, TerminalRule
 
 RLSLPRule = Union[TerminalRule, BinaryRule, RunLengthRule]
 
@@ -28,84 +28,100 @@ class RLSLP(BaseGrammar):
 
     def _referenced_nonterminals(self, rule: RLSLPRule) -> Iterable[str]:
         """Return referenced nonterminals for an RLSLP rule."""
-        if isinstance(rule, BinaryRule):
+        kind = rule.kind
+        if kind == BINARY:
             return rule.left, rule.right
-        if isinstance(rule, RunLengthRule):
+        if kind == RUN_LENGTH:
             return (rule.base,)
         return ()
 
+    def _validate_rule(self, rule: RLSLPRule) -> None:
+        """Reject empty terminals and run-length counts below 2."""
+        kind = rule.kind
+        if kind == TERMINAL and not rule.terminal:
+            raise GrammarValidationError("Terminal string must be non-empty.")
+        if kind == RUN_LENGTH and rule.count < 2:
+            raise GrammarValidationError("Run-length count must be >= 2.")
+
+    def _intern_rule(self, rule: RLSLPRule) -> RLSLPRule:
+        """Return an RLSLP rule with interned nonterminal references."""
+        kind = rule.kind
+        if kind == BINARY:
+            left, right = self._intern_name(rule.left), self._intern_name(rule.right)
+            if left is not rule.left or right is not rule.right:
+                return BinaryRule(left, right)
+        if kind == RUN_LENGTH:
+            base = self._intern_name(rule.base)
+            if base is not rule.base:
+                return RunLengthRule(base, rule.count)
+        return rule
+
     def _rule_size(self, rule: RLSLPRule) -> int:
         """Return the size contribution of an RLSLP rule."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return 1
-        if isinstance(rule, BinaryRule):
-            return 2
-        if isinstance(rule, RunLengthRule):
+        if kind == BINARY:
             return 2
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == RUN_LENGTH
+        return 2
 
     def _rule_length(self, rule: RLSLPRule, get_len) -> int:
         """Compute |exp(A)| for an RLSLP rule."""
-        if isinstance(rule, TerminalRule):
-            if not rule.terminal:
-                raise GrammarValidationError("Terminal string must be non-empty.")
+        kind = rule.kind
+        if kind == TERMINAL:
             return len(rule.terminal)
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
             return get_len(rule.left) + get_len(rule.right)
-        if isinstance(rule, RunLengthRule):
-            if rule.count < 2:
-                raise GrammarValidationError("Run-length count must be >= 2.")
-            return get_len(rule.base) * rule.count
-        raise GrammarValidationError("Unsupported rule type.")
-
-    def _rule_expand(self, rule: RLSLPRule, expand_symbol) -> str:
-        """Expand an RLSLP rule to its explicit string."""
-        if isinstance(rule, TerminalRule):
-            return rule.terminal
-        if isinstance(rule, BinaryRule):
-            return expand_symbol(rule.left) + expand_symbol(rule.right)
-        if isinstance(rule, RunLengthRule):
-            return expand_symbol(rule.base) * rule.count
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == RUN_LENGTH
+        return get_len(rule.base) * rule.count
+
+    def _rule_source(self, rule: RLSLPRule, names: Dict[str, str]) -> Tuple[str, ...]:
+        """Return Python expressions concatenating to exp(A) for an RLSLP rule."""
+        kind = rule.kind
+        if kind == TERMINAL:
+            return (repr(rule.terminal),)
+        if kind == BINARY:
+            return (names[rule.left], names[rule.right])
+        # kind == RUN_LENGTH
+        return (f"{names[rule.base]} * {rule.count}",)
 
     def _rule_char_at(self, rule: RLSLPRule, index: int, get_char, get_len) -> str:
         """Return the character at index for an RLSLP rule."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return rule.terminal[index]
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
             left_len = get_len(rule.left)
             if index < left_len:
                 return get_char(rule.left, index)
             return get_char(rule.right, index - left_len)
-        if isinstance(rule, RunLengthRule):
-            return self._char_in_repetition(rule.base, rule.count, index, get_char, get_len)
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == RUN_LENGTH
+        return get_char(rule.base, index % get_len(rule.base))
 
     def _rule_substring(
         self, rule: RLSLPRule, start: int, end: int, get_substring, get_len
     ) -> str:
         """Return the substring for an RLSLP rule (end-exclusive)."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return rule.terminal[start:end]
-        if isinstance(rule, BinaryRule):
+        if kind == BINARY:
+            # Clip [start, end) to each child; a straddling range hits both.
             left_len = get_len(rule.left)
-            if end <= left_len:
-                return get_substring(rule.left, start, end)
-            if start >= left_len:
-                return get_substring(rule.right, start - left_len, end - left_len)
-            left_part = get_substring(rule.left, start, left_len)
-            right_part = get_substring(rule.right, 0, end - left_len)
-            return left_part + right_part
-        if isinstance(rule, RunLengthRule):
-            return self._substring_in_repetition(
-                rule.base, rule.count, start, end, get_substring, get_len
-            )
-        raise GrammarValidationError("Unsupported rule type.")
+            text = ""
+            if start < left_len:
+                text = get_substring(rule.left, start, min(end, left_len))
+            if end > left_len:
+                text += get_substring(rule.right, max(start - left_len, 0), end - left_len)
+            return text
+        # kind == RUN_LENGTH
+        return self._substring_in_repetition(rule.base, start, end, get_substring, get_len)
 
     def length(self, symbol: str | None = None) -> int:
         """Return the length of the expansion of a symbol (defaults to start).
 
-        Length is computed recursively from the rules:
+        Lengths are precomputed bottom-up, in topological order, during validation:
         - Terminal rule A -> a: |exp(A)| = |a|
         - Binary rule A -> B C: |exp(A)| = |exp(B)| + |exp(C)|
         - Run-length rule A -> B^t: |exp(A)| = t * |exp(B)|
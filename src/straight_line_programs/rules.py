@@ -3,10 +3,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Tuple
+from typing import ClassVar, Tuple
 
+# Dispatch tags, exposed on every rule class as ``kind``.
+TERMINAL, BINARY, RUN_LENGTH, ITERATION = range(4)
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class TerminalRule:
     """Terminal rule A -> a.
 
@@ -15,9 +18,10 @@ class TerminalRule:
     """
 
     terminal: str
+    kind: ClassVar[int] = TERMINAL
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BinaryRule:
     """Binary concatenation rule A -> B C.
 
@@ -28,9 +32,10 @@ class BinaryRule:
 
     left: str
     right: str
+    kind: ClassVar[int] = BINARY
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RunLengthRule:
     """Run-length rule A -> B^t.
 
@@ -43,9 +48,10 @@ class RunLengthRule:
 
     base: str
     count: int
+    kind: ClassVar[int] = RUN_LENGTH
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IterationComponent:
     """One block B_r^{i^{c_r}} inside an ISLP iteration rule.
 
@@ -58,7 +64,7 @@ class IterationComponent:
     exponent: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IterationRule:
     """Iteration rule A -> prod_{i=k1}^{k2} B_1^{i^{c_1}} ... B_t^{i^{c_t}}.
 
@@ -71,3 +77,4 @@ class IterationRule:
     k1: int
     k2: int
     components: Tuple[IterationComponent, ...]
+    kind: ClassVar[int] = ITERATION
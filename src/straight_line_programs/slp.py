@@ -2,11 +2,12 @@
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, Tuple, Union
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from .base import BaseGrammar
 from .errors import GrammarValidationError
-from .rules import BinaryRule, TerminalRule
+from .rules import BINARY, TERMINAL, BinaryRule, TerminalRule
 
 SLPRule = Union[TerminalRule, BinaryRule]
 
@@ -20,75 +21,384 @@ class SLP(BaseGrammar):
     Args:
         rules: Mapping from nonterminal names to terminal or binary rules.
         start: Start symbol for the grammar.
+        inline_threshold: If positive, binary rules whose expansion has at
+            most this many characters are collapsed into terminal leaves for
+            expansion and random access. Size and nested expressions still
+            reflect the rules as given.
     """
 
     rule_types: Tuple[type, ...] = (TerminalRule, BinaryRule)
 
-    def __init__(self, rules: Dict[str, SLPRule], start: str) -> None:
+    def __init__(self, rules: Dict[str, SLPRule], start: str, inline_threshold: int = 0) -> None:
+        self.inline_threshold = inline_threshold
+        self._ids: Dict[str, int] = {}
+        self._kind: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._length: List[int] = []
+        self._left_length: List[int] = []
+        self._terminal: List[str] = []
+        self._terminal_bytes: Optional[List[bytes]] = None
+        self._formatted_terminal: Dict[str, str] = {}
         super().__init__(rules, start)
 
+    @classmethod
+    def from_rules(
+        cls,
+        rules: Dict[str, SLPRule],
+        start: str,
+        hash_cons: bool = True,
+        inline_threshold: int = 0,
+    ) -> "SLP":
+        """Build an SLP, optionally merging structurally identical rules.
+
+        With hash_cons, rules are visited children first and rewritten to
+        refer to canonical symbols; a rule equal to one already seen (same
+        terminal, or same canonical children) is dropped and its symbol
+        mapped to the first one, except that the start symbol always stands
+        for its own class. The result generates the same string with every
+        shared subtree stored once, so the per-call memos of the expansion
+        and slicing walkers reuse it. Dropped symbols are no longer defined.
+
+        Args:
+            rules: Mapping from nonterminal names to terminal or binary rules.
+            start: Start symbol for the grammar.
+            hash_cons: Merge identical rules before building the grammar.
+            inline_threshold: Passed on to the constructor.
+        """
+        grammar = cls(rules, start, inline_threshold=inline_threshold)
+        if not hash_cons:
+            return grammar
+        canonical: Dict[str, str] = {}
+        seen: Dict[SLPRule, str] = {}
+        for symbol in grammar._topo_order:
+            rule = grammar.rules[symbol]
+            if rule.kind == BINARY:
+                rule = BinaryRule(canonical[rule.left], canonical[rule.right])
+            canonical[symbol] = seen.setdefault(rule, symbol)
+        if len(seen) == len(grammar.rules):
+            return grammar
+        start = grammar.start
+        replaced = canonical[start]
+        if replaced != start:
+            canonical = {
+                symbol: start if target == replaced else target
+                for symbol, target in canonical.items()
+            }
+        consed: Dict[str, SLPRule] = {}
+        for symbol in grammar._topo_order:
+            if canonical[symbol] != symbol:
+                continue
+            rule = grammar.rules[symbol]
+            if rule.kind == BINARY:
+                rule = BinaryRule(canonical[rule.left], canonical[rule.right])
+            consed[symbol] = rule
+        return cls(consed, start, inline_threshold=inline_threshold)
+
+    def validate(self) -> None:
+        """Validate the grammar and flatten it into parallel per-id lists.
+
+        Symbols get integer ids in topological order (children first). For
+        id i, _kind[i] is the rule kind, _length[i] is |exp|, and either
+        _terminal[i] holds the terminal string or _left[i] / _right[i] hold
+        the child ids and _left_length[i] the length of the left child (-1, 0
+        and "" fill the unused slots).
+        """
+        super().validate()
+        self._formatted_terminal = {
+            symbol: self._format_terminal(rule.terminal)
+            for symbol, rule in self.rules.items()
+            if rule.kind == TERMINAL
+        }
+        if self.inline_threshold > 0:
+            self._access_rules = self._inline_short_rules(self.inline_threshold)
+        rules = self._access_rules
+        lengths = self._lengths
+        ids = {symbol: i for i, symbol in enumerate(self._topo_order)}
+        kinds, lefts, rights, terminals = [], [], [], []
+        for symbol in self._topo_order:
+            rule = rules[symbol]
+            kinds.append(rule.kind)
+            if rule.kind == TERMINAL:
+                lefts.append(-1)
+                rights.append(-1)
+                terminals.append(rule.terminal)
+            else:
+                lefts.append(ids[rule.left])
+                rights.append(ids[rule.right])
+                terminals.append("")
+        self._ids = ids
+        self._kind = kinds
+        self._left = lefts
+        self._right = rights
+        self._length = [lengths[symbol] for symbol in self._topo_order]
+        self._left_length = [
+            lengths[rules[symbol].left] if kind == BINARY else 0
+            for symbol, kind in zip(self._topo_order, kinds)
+        ]
+        self._terminal = terminals
+        # Encoded once so ASCII expansions copy bytes without re-encoding.
+        if all(terminal.isascii() for terminal in terminals):
+            self._terminal_bytes = [terminal.encode("ascii") for terminal in terminals]
+        else:
+            self._terminal_bytes = None
+
+    def _inline_short_rules(self, threshold: int) -> Dict[str, SLPRule]:
+        """Return rules with short binary subtrees replaced by terminal leaves.
+
+        Children precede parents in the topological order, so a binary rule
+        whose children are both (possibly collapsed) terminals is joined into
+        a single terminal as long as its expansion fits the threshold.
+        """
+        lengths = self._lengths
+        inlined = dict(self.rules)
+        for symbol in self._topo_order:
+            rule = inlined[symbol]
+            if rule.kind != BINARY or lengths[symbol] > threshold:
+                continue
+            left = inlined[rule.left]
+            right = inlined[rule.right]
+            if left.kind == TERMINAL and right.kind == TERMINAL:
+                inlined[symbol] = TerminalRule(left.terminal + right.terminal)
+        return inlined
+
+    def _char_at_symbol(self, symbol: str, index: int) -> str:
+        """Return the character at index, descending child ids in a loop.
+
+        Each level reads the kind, the stored left-child length and one child
+        id; TERMINAL is 0, so the loop test is a plain truth check.
+        """
+        kinds = self._kind
+        lefts = self._left
+        rights = self._right
+        left_lengths = self._left_length
+        node = self._ids[symbol]
+        while kinds[node]:
+            left_len = left_lengths[node]
+            if index < left_len:
+                node = lefts[node]
+            else:
+                index -= left_len
+                node = rights[node]
+        return self._terminal[node][index]
+
+    def char_at_many(self, indices: Sequence[int], symbol: str | None = None) -> List[str]:
+        """Return the characters at several positions (0-based), in the given order.
+
+        The positions are sorted and descend the grammar together: every
+        binary rule splits its run of pending positions between the children,
+        so a path shared by several positions is walked once.
+
+        Args:
+            indices: 0-based positions in the expansion.
+            symbol: Nonterminal to index. Defaults to the start symbol.
+        """
+
+        sym = symbol or self.start
+        length = self._lengths[sym]
+        for index in indices:
+            if index < 0 or index >= length:
+                raise IndexError(f"Index {index} out of range for length {length}.")
+        order = sorted(range(len(indices)), key=indices.__getitem__)
+        positions = [indices[i] for i in order]
+        chars = [""] * len(positions)
+        kinds = self._kind
+        lefts = self._left
+        rights = self._right
+        left_lengths = self._left_length
+        terminals = self._terminal
+        # (id, offset of its expansion, [lo, hi) run of positions inside it)
+        stack = [(self._ids[sym], 0, 0, len(positions))]
+        push = stack.append
+        pop = stack.pop
+        while stack:
+            node, offset, lo, hi = pop()
+            if kinds[node] == TERMINAL:
+                terminal = terminals[node]
+                for i in range(lo, hi):
+                    chars[i] = terminal[positions[i] - offset]
+                continue
+            split = offset + left_lengths[node]
+            mid = bisect_left(positions, split, lo, hi)
+            if lo < mid:
+                push((lefts[node], offset, lo, mid))
+            if mid < hi:
+                push((rights[node], split, mid, hi))
+        result = [""] * len(positions)
+        for i, char in zip(order, chars):
+            result[i] = char
+        return result
+
+    def _substring_symbol(self, symbol: str, start: int, end: int) -> str:
+        """Return the substring within a symbol expansion (end-exclusive).
+
+        Same walk as BaseGrammar._substring_symbol, specialised to binary
+        rules over the per-id lists: (id, start, end) entries are split
+        between the children inline instead of through rule hooks, and
+        fully covered ids are memoized for the duration of the call.
+        """
+        node = self._ids[symbol]
+        if self._terminal_bytes is not None and start == 0 and end == self._length[node]:
+            return self._expand_ascii(node)
+        kinds = self._kind
+        lefts = self._left
+        rights = self._right
+        lengths = self._length
+        left_lengths = self._left_length
+        terminals = self._terminal
+        stack = [(node, start, end)]
+        push = stack.append
+        pop = stack.pop
+        parts: List[str] = []  # in reverse order
+        emit = parts.append
+        # id -> (first, stop) range into parts, or its joined expansion
+        expanded: Dict[int, Union[Tuple[int, int], str]] = {}
+        while stack:
+            node, sub_start, sub_end = pop()
+            if sub_start < 0:
+                # End marker: sub_end holds where the expansion of node began.
+                expanded[node] = (sub_end, len(parts))
+                continue
+            if kinds[node] == TERMINAL:
+                emit(terminals[node][sub_start:sub_end])
+                continue
+            full = sub_start == 0 and sub_end == lengths[node]
+            if node in expanded:
+                text = expanded[node]
+                if not isinstance(text, str):
+                    text = expanded[node] = "".join(reversed(parts[text[0] : text[1]]))
+                emit(text if full else text[sub_start:sub_end])
+                continue
+            if full:
+                push((node, -1, len(parts)))
+            left_len = left_lengths[node]
+            if sub_start < left_len:
+                push((lefts[node], sub_start, sub_end if sub_end < left_len else left_len))
+            if sub_end > left_len:
+                right_start = sub_start - left_len if sub_start > left_len else 0
+                push((rights[node], right_start, sub_end - left_len))
+        parts.reverse()
+        return "".join(parts)
+
+    def _expand_ascii(self, node: int) -> str:
+        """Expand an id of an ASCII grammar into one preallocated buffer.
+
+        Every id is written at its final offset. The first occurrence of a
+        binary id is walked; later occurrences copy the bytes already
+        written for it, so each output byte is written once.
+        """
+        kinds = self._kind
+        lefts = self._left
+        rights = self._right
+        lengths = self._length
+        terminals = self._terminal_bytes
+        buf = bytearray(lengths[node])
+        view = memoryview(buf)
+        first: Dict[int, int] = {}  # id -> offset of its first expansion
+        stack = [(node, 0)]
+        push = stack.append
+        pop = stack.pop
+        while stack:
+            node, offset = pop()
+            if kinds[node] == TERMINAL:
+                terminal = terminals[node]
+                buf[offset : offset + len(terminal)] = terminal
+                continue
+            source = first.get(node)
+            if source is not None:
+                length = lengths[node]
+                view[offset : offset + length] = view[source : source + length]
+                continue
+            first[node] = offset
+            left = lefts[node]
+            push((rights[node], offset + lengths[left]))
+            push((left, offset))
+        view.release()
+        return buf.decode("ascii")
+
     def _referenced_nonterminals(self, rule: SLPRule) -> Iterable[str]:
         """Return referenced nonterminals for an SLP rule."""
-        if isinstance(rule, BinaryRule):
+        if rule.kind == BINARY:
             return (rule.left, rule.right)
         return ()
 
+    def _validate_rule(self, rule: SLPRule) -> None:
+        """Reject empty terminals."""
+        if rule.kind == TERMINAL and not rule.terminal:
+            raise GrammarValidationError("Terminal string must be non-empty.")
+
+    def _intern_rule(self, rule: SLPRule) -> SLPRule:
+        """Return an SLP rule with interned nonterminal references."""
+        kind = rule.kind
+        if kind == BINARY:
+            left, right = self._intern_name(rule.left), self._intern_name(rule.right)
+            if left is not rule.left or right is not rule.right:
+                return BinaryRule(left, right)
+        return rule
+
     def _rule_size(self, rule: SLPRule) -> int:
         """Return the size contribution of an SLP rule."""
-        if isinstance(rule, TerminalRule):
+        kind = rule.kind
+        if kind == TERMINAL:
             return 1
-        if isinstance(rule, BinaryRule):
-            return 2
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == BINARY
+        return 2
 
     def _rule_length(self, rule: SLPRule, get_len) -> int:
         """Compute |exp(A)| for an SLP rule."""
-        if isinstance(rule, TerminalRule):
-            if not rule.terminal:
-                raise GrammarValidationError("Terminal string must be non-empty.")
+        kind = rule.kind
+        if kind == TERMINAL:
             return len(rule.terminal)
-        if isinstance(rule, BinaryRule):
-            return get_len(rule.left) + get_len(rule.right)
-        raise GrammarValidationError("Unsupported rule type.")
-
-    def _rule_expand(self, rule: SLPRule, expand_symbol) -> str:
-        """Expand an SLP rule to its explicit string."""
-        if isinstance(rule, TerminalRule):
-            return rule.terminal
-        if isinstance(rule, BinaryRule):
-            return expand_symbol(rule.left) + expand_symbol(rule.right)
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == BINARY
+        return get_len(rule.left) + get_len(rule.right)
+
+    def _rule_source(self, rule: SLPRule, names: Dict[str, str]) -> Tuple[str, ...]:
+        """Return Python expressions concatenating to exp(A) for an SLP rule."""
+        kind = rule.kind
+        if kind == TERMINAL:
+            return (repr(rule.terminal),)
+        # kind == BINARY
+        return (names[rule.left], names[rule.right])
 
     def _rule_char_at(self, rule: SLPRule, index: int, get_char, get_len) -> str:
-        """Return the character at index for an SLP rule."""
-        if isinstance(rule, TerminalRule):
+        """Return the character at index for an SLP rule.
+
+        SLP.char_at descends the per-id lists directly, so this hook only runs
+        when the generic BaseGrammar._char_at_symbol is used on an SLP.
+        """
+        kind = rule.kind
+        if kind == TERMINAL:
             return rule.terminal[index]
-        if isinstance(rule, BinaryRule):
-            left_len = get_len(rule.left)
-            if index < left_len:
-                return get_char(rule.left, index)
-            return get_char(rule.right, index - left_len)
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == BINARY
+        left_len = get_len(rule.left)
+        if index < left_len:
+            return get_char(rule.left, index)
+        return get_char(rule.right, index - left_len)
 
     def _rule_substring(self, rule: SLPRule, start: int, end: int, get_substring, get_len) -> str:
-        """Return the substring for an SLP rule (end-exclusive)."""
-        if isinstance(rule, TerminalRule):
+        """Return the substring for an SLP rule (end-exclusive).
+
+        SLP.substring and SLP.expression walk the per-id lists directly, so
+        this hook only runs when the generic BaseGrammar._substring_symbol is
+        used on an SLP.
+        """
+        kind = rule.kind
+        if kind == TERMINAL:
             return rule.terminal[start:end]
-        if isinstance(rule, BinaryRule):
-            left_len = get_len(rule.left)
-            if end <= left_len:
-                return get_substring(rule.left, start, end)
-            if start >= left_len:
-                return get_substring(rule.right, start - left_len, end - left_len)
-            left_part = get_substring(rule.left, start, left_len)
-            right_part = get_substring(rule.right, 0, end - left_len)
-            return left_part + right_part
-        raise GrammarValidationError("Unsupported rule type.")
+        # kind == BINARY: clip [start, end) to each child; a straddling
+        # range hits both.
+        left_len = get_len(rule.left)
+        text = ""
+        if start < left_len:
+            text = get_substring(rule.left, start, min(end, left_len))
+        if end > left_len:
+            text += get_substring(rule.right, max(start - left_len, 0), end - left_len)
+        return text
 
     def length(self, symbol: str | None = None) -> int:
         """Return the length of the expansion of a symbol (defaults to start).
 
-        Length is computed recursively from the rules:
+        Lengths are precomputed bottom-up, in topological order, during validation:
         - Terminal rule A -> a: |exp(A)| = |a|
         - Binary rule A -> B C: |exp(A)| = |exp(B)| + |exp(C)|
 
@@ -102,17 +412,52 @@ class SLP(BaseGrammar):
         """Return a nested, parenthesized expression of how the string is built."""
 
         sym = symbol or self.start
-        return self._nested_symbol(sym)
-
-    def _nested_symbol(self, symbol: str) -> str:
-        rule = self.rules[symbol]
-        if isinstance(rule, TerminalRule):
-            return self._format_terminal(rule.terminal)
-        if isinstance(rule, BinaryRule):
-            left = self._nested_symbol(rule.left)
-            right = self._nested_symbol(rule.right)
-            return f"({left} {right})"
-        raise GrammarValidationError("Unsupported rule type.")
+        out: List[str] = []
+        self._nested_symbol_into(sym, out)
+        return "".join(out)
+
+    def _nested_symbol_into(self, symbol: str, out: List[str]) -> None:
+        """Append the tokens of a nested expression to out, joined once by the caller.
+
+        An explicit stack replaces recursion: entries are (symbol, -1) for a
+        symbol to format, (token, -2) for a literal token and (symbol, begin)
+        for the end of a binary symbol whose tokens start at out[begin]. That
+        (begin, stop) range is remembered, and later occurrences of the same
+        nonterminal reuse it, joined once on first reuse.
+        """
+        rules = self.rules
+        formatted_terminals = self._formatted_terminal
+        emit = out.append
+        # symbol -> (begin, stop) range into out, or its joined tokens
+        formatted: Dict[str, Union[Tuple[int, int], str]] = {}
+        stack = [(symbol, -1)]
+        push = stack.append
+        pop = stack.pop
+        while stack:
+            symbol, begin = pop()
+            if begin == -2:
+                emit(symbol)
+                continue
+            if begin >= 0:
+                formatted[symbol] = (begin, len(out))
+                continue
+            if symbol in formatted:
+                text = formatted[symbol]
+                if not isinstance(text, str):
+                    text = formatted[symbol] = "".join(out[text[0] : text[1]])
+                emit(text)
+                continue
+            terminal = formatted_terminals.get(symbol)
+            if terminal is not None:
+                emit(terminal)
+                continue
+            rule = rules[symbol]
+            push((symbol, len(out)))
+            emit("(")
+            push((")", -2))
+            push((rule.right, -1))
+            push((" ", -2))
+            push((rule.left, -1))
 
     @staticmethod
     def _format_terminal(terminal: str) -> str:
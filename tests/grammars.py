@@ -0,0 +1,24 @@
+"""Grammar builders shared by the tests."""
+
+from straight_line_programs import BinaryRule, TerminalRule
+
+
+def fibonacci_rules(n, first="b", second="a"):
+    """Return rules F1 -> first, F2 -> second and F_k -> F_{k-1} F_{k-2} up to F_n."""
+    rules = {"F1": TerminalRule(first), "F2": TerminalRule(second)}
+    for k in range(3, n + 1):
+        rules[f"F{k}"] = BinaryRule(f"F{k - 1}", f"F{k - 2}")
+    return rules
+
+
+def doubling_rules(n, a="a", b="b", pad_every=0):
+    """Return rules C -> A B and D_k -> D_{k-1} D_{k-1} (D_0 = C) up to D_n.
+
+    With pad_every, every pad_every-th level appends B instead of doubling.
+    """
+    rules = {"A": TerminalRule(a), "B": TerminalRule(b), "C": BinaryRule("A", "B")}
+    for k in range(1, n + 1):
+        prev = "C" if k == 1 else f"D{k - 1}"
+        padded = pad_every and k % pad_every == 0
+        rules[f"D{k}"] = BinaryRule(prev, "B" if padded else prev)
+    return rules
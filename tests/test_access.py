@@ -1,5 +1,6 @@
 import pytest
 
+from grammars import fibonacci_rules
 from straight_line_programs import (
     BinaryRule,
     ISLP,
@@ -32,6 +33,18 @@ def test_slp_char_at_and_substring():
         slp.substring(1, 5)
 
 
+def test_slp_char_at_many():
+    slp = SLP(fibonacci_rules(15, "b", "ac"), start="F15")
+    expected = slp.expression()
+    indices = [len(expected) - 1, 0, 17, 17, 3, 250, 1]
+    assert slp.char_at_many(indices) == [expected[i] for i in indices]
+    assert slp.char_at_many(range(len(expected))) == list(expected)
+    assert slp.char_at_many([2, 0, 4], symbol="F4") == ["b", "a", "c"]
+    assert slp.char_at_many([]) == []
+    with pytest.raises(IndexError):
+        slp.char_at_many([0, len(expected)])
+
+
 def test_rlslp_char_at_and_substring():
     rules = {
         "A": TerminalRule("ab"),
@@ -59,3 +72,45 @@ def test_islp_char_at_and_substring():
     assert islp.char_at(1) == "b"
     assert islp.char_at(13) == "b"
     assert islp.substring(2, 9) == "aabaaab"
+
+
+def test_deep_grammar_access_without_recursion():
+    depth = 5000
+    rules = {"A": TerminalRule("a"), "B": TerminalRule("b"), "N0": TerminalRule("c")}
+    for k in range(1, depth + 1):
+        rules[f"N{k}"] = BinaryRule(f"N{k - 1}", "A" if k % 2 else "B")
+    slp = SLP(rules, start=f"N{depth}")
+    expected = "c" + "ab" * (depth // 2)
+    assert slp.length() == depth + 1
+    assert slp.expression() == expected
+    assert slp.char_at(depth) == "b"
+    assert slp.substring(depth - 3, depth + 1) == expected[-4:]
+
+
+def test_binary_rules_straddling_runs_and_iterations():
+    rlslp = RLSLP(
+        {
+            "A": TerminalRule("ab"),
+            "B": TerminalRule("c"),
+            "R": RunLengthRule("A", 3),
+            "X": BinaryRule("B", "R"),
+            "S": BinaryRule("X", "R"),
+        },
+        start="S",
+    )
+    islp = ISLP(
+        {
+            "A": TerminalRule("a"),
+            "B": TerminalRule("bc"),
+            "I": IterationRule(1, 3, (IterationComponent("A", 1), IterationComponent("B", 0))),
+            "X": BinaryRule("B", "I"),
+            "S": BinaryRule("X", "I"),
+        },
+        start="S",
+    )
+    for grammar in (rlslp, islp):
+        expected = grammar.expression()
+        for start in range(len(expected)):
+            assert grammar.char_at(start) == expected[start]
+            for end in range(start, len(expected) + 1):
+                assert grammar.substring(start, end) == expected[start:end]
@@ -1,4 +1,5 @@
 from straight_line_programs import (
+    BinaryRule,
     ISLP,
     IterationComponent,
     IterationRule,
@@ -32,3 +33,42 @@ def test_islp_rule_size():
     )
     islp = ISLP({"A": TerminalRule("a"), "B": TerminalRule("b"), "S": rule}, start="S")
     assert islp.size() == 1 + 1 + 6
+
+
+def test_islp_length_large_iteration_range():
+    n = 10**6
+    rule = IterationRule(
+        k1=1,
+        k2=n,
+        components=(IterationComponent("A", 2), IterationComponent("B", 0)),
+    )
+    islp = ISLP({"A": TerminalRule("a"), "B": TerminalRule("bb"), "S": rule}, start="S")
+    assert islp.length() == n * (n + 1) * (2 * n + 1) // 6 + 2 * n
+
+
+def test_islp_length_high_exponents():
+    rule = IterationRule(
+        k1=2,
+        k2=9,
+        components=(IterationComponent("A", 5), IterationComponent("B", 7)),
+    )
+    islp = ISLP({"A": TerminalRule("a"), "B": TerminalRule("bc"), "S": rule}, start="S")
+    assert islp.length() == sum(i**5 + 2 * i**7 for i in range(2, 10))
+
+
+def test_islp_compiled_and_walked_expansion_agree():
+    rules = {
+        "A": TerminalRule("a"),
+        "B": TerminalRule("bc"),
+        "C": BinaryRule("A", "B"),
+        "S": IterationRule(
+            k1=2,
+            k2=5,
+            components=(IterationComponent("C", 1), IterationComponent("A", 2)),
+        ),
+    }
+    compiled = ISLP(rules, start="S")
+    walked = ISLP(rules, start="S")
+    walked.compile_threshold = 1
+    assert compiled.expression() == walked.expression()
+    assert compiled.expression("C") == walked.expression("C") == "abc"
@@ -21,3 +21,30 @@ def test_rlslp_ab_power_100_length_only():
     }
     rlslp = RLSLP(rules, start="S")
     assert rlslp.length() == 200
+
+
+def test_rlslp_long_run_expansion_and_slicing():
+    rules = {
+        "A1": TerminalRule("a"),
+        "A2": TerminalRule("b"),
+        "A3": BinaryRule("A1", "A2"),
+        "S": RunLengthRule("A3", 40000),
+    }
+    rlslp = RLSLP(rules, start="S")
+    assert rlslp.expression() == "ab" * 40000
+    assert rlslp.substring(1, 7) == "bababa"
+    assert rlslp.substring(3, 5) == "ba"
+
+
+def test_rlslp_compiled_expansion_with_shared_and_single_use_rules():
+    rules = {
+        "A": TerminalRule("a"),
+        "B": TerminalRule("b"),
+        "C": BinaryRule("A", "B"),
+        "D": RunLengthRule("C", 3),
+        "E": BinaryRule("D", "A"),
+        "S": BinaryRule("E", "C"),
+    }
+    walked = RLSLP(rules, start="S")
+    walked.compile_threshold = 1
+    assert RLSLP(rules, start="S").expression() == walked.expression() == "abababaab"
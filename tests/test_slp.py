@@ -1,3 +1,4 @@
+from grammars import doubling_rules, fibonacci_rules
 from straight_line_programs import BinaryRule, SLP, TerminalRule
 
 
@@ -13,3 +14,126 @@ def test_slp_abab():
     assert slp.length() == 4
     assert slp.size() == 6
     assert slp.expression_nested() == "((a b) (a b))"
+
+
+def test_slp_fibonacci_shared_expansion():
+    words = ["b", "a"]
+    while len(words) < 25:
+        words.append(words[-1] + words[-2])
+    slp = SLP(fibonacci_rules(25), start="F25")
+    assert slp.expression() == words[-1]
+    assert slp.substring(1000, 1200) == words[-1][1000:1200]
+
+
+def test_slp_expression_disk_cache(tmp_path):
+    rules = {
+        "A1": TerminalRule("a\r"),
+        "A2": TerminalRule("\r\nb"),
+        "A3": BinaryRule("A1", "A2"),
+        "S": BinaryRule("A3", "A3"),
+    }
+    expected = "a\r\r\nb" * 2
+    slp = SLP(rules, start="S")
+    assert slp.expression(cache_dir=tmp_path) == expected
+    cached = list(tmp_path.iterdir())
+    assert len(cached) == 1
+    assert cached[0].read_bytes() == expected.encode("utf-8")
+    assert SLP(rules, start="S").expression(cache_dir=tmp_path) == expected
+    assert slp.expression("A3", cache_dir=tmp_path) == "a\r\r\nb"
+    assert SLP(rules, start="S").expression("A3", cache_dir=tmp_path) == "a\r\r\nb"
+    assert len(list(tmp_path.iterdir())) == 2
+    slp.rules["A1"] = TerminalRule("x")
+    slp.validate()
+    assert slp.expression(cache_dir=tmp_path) == "x\r\nbx\r\nb"
+
+
+def test_slp_expression_nested_shared_subtrees():
+    slp = SLP(doubling_rules(18), start="D2")
+    assert slp.expression_nested() == "(((a b) (a b)) ((a b) (a b)))"
+    assert len(slp.expression_nested("D18")) == 2**18 * len("(a b)") + (2**18 - 1) * 3
+
+
+def test_slp_inline_threshold_collapses_short_rules():
+    rules = fibonacci_rules(19)
+    plain = SLP(rules, start="F19")
+    inlined = SLP(rules, start="F19", inline_threshold=64)
+    assert inlined._access_rules["F10"] == TerminalRule(plain.expression("F10"))
+    assert inlined._access_rules["F19"].kind == plain.rules["F19"].kind
+    assert inlined.size() == plain.size()
+    assert inlined.expression_nested("F5") == plain.expression_nested("F5")
+    expected = plain.expression()
+    assert inlined.expression() == expected
+    assert inlined.substring(100, 2000) == expected[100:2000]
+    assert "".join(inlined.char_at(i) for i in range(0, len(expected), 7)) == expected[::7]
+
+
+def test_slp_full_slice_ascii_and_unicode():
+    for a, b in (("a", "bc"), ("ä", "bc")):
+        slp = SLP(doubling_rules(11, a, b, pad_every=3), start="D11")
+        expected = slp.expression()
+        assert slp.substring(0, slp.length()) == expected
+        assert slp.substring(0, slp.length("D5"), symbol="D5") == slp.expression("D5")
+
+
+def test_slp_expansion_cache_is_bounded():
+    slp = SLP(doubling_rules(5), start="D5")
+    slp.expansion_cache_size = 2
+    slp.expansion_cache_limit = 16
+    assert slp.expression() == "ab" * 32
+    assert "D5" not in slp._expansion_cache
+    assert slp.expression("D1") is slp.expression("D1")
+    slp.expression("D2")
+    slp.expression("D1")
+    slp.expression("C")
+    assert list(slp._expansion_cache) == ["D1", "C"]
+
+
+def test_slp_expression_nested_deep_chain():
+    rules = {"A": TerminalRule("a"), "N0": TerminalRule("bc")}
+    for k in range(1, 5001):
+        rules[f"N{k}"] = BinaryRule(f"N{k - 1}", "A")
+    slp = SLP(rules, start="N5000")
+    nested = slp.expression_nested()
+    assert nested == "(" * 5000 + '"bc"' + " a)" * 5000
+
+
+def test_slp_from_rules_hash_cons():
+    rules = {
+        "A": TerminalRule("a"),
+        "A'": TerminalRule("a"),
+        "B": TerminalRule("b"),
+        "X": BinaryRule("A", "B"),
+        "Y": BinaryRule("A'", "B"),
+        "L": BinaryRule("X", "X"),
+        "R": BinaryRule("Y", "X"),
+        "S": BinaryRule("L", "R"),
+    }
+    plain = SLP.from_rules(rules, start="S", hash_cons=False)
+    assert plain.rules == SLP(rules, start="S").rules
+    consed = SLP.from_rules(rules, start="S")
+    assert consed.expression() == plain.expression() == "abababab"
+    assert set(consed.nonterminals()) == {"A", "B", "X", "L", "S"}
+    assert consed.rules["S"] == BinaryRule("L", "L")
+    assert consed.start == "S"
+    assert consed.size() < plain.size()
+    assert consed.substring(1, 7) == "bababa"
+
+
+def test_slp_from_rules_keeps_start_symbol():
+    rules = {
+        "A": TerminalRule("a"),
+        "B": TerminalRule("b"),
+        "X": BinaryRule("A", "B"),
+        "P": BinaryRule("X", "A"),
+        "S": BinaryRule("X", "A"),
+        "T": BinaryRule("P", "S"),
+    }
+    consed = SLP.from_rules(rules, start="S")
+    assert consed.start == "S"
+    assert set(consed.nonterminals()) == {"A", "B", "X", "S", "T"}
+    assert consed.rules["T"] == BinaryRule("S", "S")
+    assert consed.expression("S") == "aba"
+    assert consed.expression("T") == "abaaba"
+    terminal = SLP.from_rules({"A": TerminalRule("a"), "S": TerminalRule("a")}, start="S")
+    assert terminal.start == "S"
+    assert terminal.expression("S") == "a"
@@ -1,3 +1,5 @@
+from enum import Enum
+
 import pytest
 
 from straight_line_programs import (
@@ -47,6 +49,16 @@ def test_expression_max_length_guard():
     slp = SLP({"S": TerminalRule("abcd")}, start="S")
     with pytest.raises(ExpansionTooLargeError):
         slp.expression(max_length=3)
+    assert slp.expression(max_length=4) == "abcd"
+
+
+def test_expression_max_length_checked_before_expanding():
+    rules = {"A": TerminalRule("ab"), "S": RunLengthRule("A", 10**15)}
+    rlslp = RLSLP(rules, start="S")
+    with pytest.raises(ExpansionTooLargeError):
+        rlslp.expression()
+    with pytest.raises(ExpansionTooLargeError):
+        rlslp.expression(max_length=2 * 10**15 - 1)
 
 
 def test_nonterminals_and_empty_slice():
@@ -61,21 +73,20 @@ def test_include_end_bounds_error():
         slp.substring(0, 3, include_end=True)
 
 
-def test_repetition_helpers_bounds():
+def test_repetition_helpers():
     def get_len(_symbol: str) -> int:
         return 2
 
     def get_char(_symbol: str, index: int) -> str:
         return "ab"[index]
 
-    def get_substring(_symbol: str, start: int, end: int) -> str:
-        return "ab"[start:end]
+    def get_substring(_symbol: str, start: int, end: int, repeat: int = 1) -> str:
+        return "ab"[start:end] * repeat
 
-    assert BaseGrammar._substring_in_repetition("A", 3, 2, 2, get_substring, get_len) == ""
-    with pytest.raises(IndexError):
-        BaseGrammar._char_in_repetition("A", 3, 6, get_char, get_len)
-    with pytest.raises(IndexError):
-        BaseGrammar._substring_in_repetition("A", 3, 0, 7, get_substring, get_len)
+    assert BaseGrammar._substring_in_repetition("A", 2, 2, get_substring, get_len) == ""
+    assert BaseGrammar._substring_in_repetition("A", 1, 8, get_substring, get_len) == "bababab"
+    assert BaseGrammar._substring_in_repetition("A", 2, 4, get_substring, get_len) == "ab"
+    assert BaseGrammar._char_in_repetition("A", 5, get_char, get_len) == "b"
 
 
 def test_slp_expression_nested_multichar_terminal():
@@ -147,3 +158,19 @@ def test_islp_iteration_validation_and_slicing_branches():
         )
     with pytest.raises(IndexError):
         islp._rule_char_at(rules["S"], 9, islp._char_at_symbol, islp._lengths.__getitem__)
+
+
+def test_non_plain_str_symbol_names():
+    class N(str, Enum):
+        A = "A"
+        B = "B"
+        S = "S"
+
+    rules = {N.A: TerminalRule("a"), N.B: TerminalRule("bc"), N.S: BinaryRule(N.A, N.B)}
+    for grammar in (SLP(rules, N.S), RLSLP(rules, N.S), ISLP(rules, N.S)):
+        assert grammar.expression() == "abc"
+        assert grammar.char_at(2) == "c"
+        assert grammar.substring(1, 3) == "bc"
+    assert SLP(rules, N.S).expression_nested() == '(a "bc")'
+    with pytest.raises(GrammarValidationError):
+        SLP({"S": BinaryRule(1, 2)}, start="S")